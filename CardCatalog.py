@@ -0,0 +1,129 @@
+"""
+卡牌目录: 由CardRank数据构建,对类型/属性/轨道/排行强度建立倒排索引,
+用于快速筛选卡牌,例如 对决排行 T0 歌唱 支援 红轨 的所有卡牌;识别器也可用它缩小候选范围
+"""
+
+INDEX_FIELDS = ['idol_type', 'idol_rarity', 'railcolor', 'category', 'strength']
+
+
+def is_missing(value):
+    """None或Excel空单元格读出的NaN"""
+    import pandas as pd
+    return value is None or (not isinstance(value, (list, tuple, set, dict)) and bool(pd.isna(value)))
+
+
+def parse_rank_text(text):
+    """解析merge_card_ranks生成的排行文本: '通常排行:T0,对决排行:T1' -> [(类别, 强度)]"""
+    if is_missing(text):
+        return []
+    text = str(text)
+    if not text or text == 'nan':
+        return []
+    ranks = []
+    for item in text.split(','):
+        if ':' not in item:
+            continue
+        category, strength = item.split(':', 1)
+        ranks.append((category.strip(), strength.strip()))
+    return ranks
+
+
+class CardCatalog:
+    def __init__(self, records):
+        self.records = []  # 卡牌信息列表,下标即卡牌编号
+        self.name_to_id = {}
+        self.indexes = {field: {} for field in INDEX_FIELDS}
+        self.rank_index = {}  # (类别, 强度) -> 卡牌编号集合
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """从CardRank(merge_card_ranks结果)或CardData的DataFrame构建"""
+        return cls(df.to_dict('records'))
+
+    def _index(self, field, value, card_id):
+        self.indexes[field].setdefault(value, set()).add(card_id)
+
+    def add(self, record):
+        card_name = record['card_name']
+        card_id = self.name_to_id.get(card_name)
+        if card_id is None:
+            card_id = len(self.records)
+            self.records.append(record)
+            self.name_to_id[card_name] = card_id
+        for field in ['idol_type', 'idol_rarity']:
+            if not is_missing(record.get(field)):
+                self._index(field, str(record[field]), card_id)
+        # 轨道色形如 '歌唱-红轨',同时索引完整值和 '红轨'
+        railcolor = record.get('railcolor')
+        if not is_missing(railcolor):
+            railcolor = str(railcolor)
+            self._index('railcolor', railcolor, card_id)
+            self._index('railcolor', railcolor.split('-')[-1], card_id)
+        # CardRank的排行文本,CardData则直接带category/strength列
+        ranks = parse_rank_text(record.get('main_ranks')) + parse_rank_text(record.get('other_ranks'))
+        if not is_missing(record.get('category')) and not is_missing(record.get('strength')):
+            ranks.append((str(record['category']), str(record['strength'])))
+        for category, strength in ranks:
+            self._index('category', category, card_id)
+            self._index('strength', strength, card_id)
+            self.rank_index.setdefault((category, strength), set()).add(card_id)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, card_name):
+        card_id = self.name_to_id.get(card_name)
+        return None if card_id is None else self.records[card_id]
+
+    def values(self, field):
+        """某字段的所有取值,便于界面生成下拉选项"""
+        return sorted(self.indexes[field])
+
+    def _lookup(self, field, value):
+        """单个字段的匹配集合,value为列表/元组时取并集"""
+        if isinstance(value, (list, tuple, set)):
+            result = set()
+            for item in value:
+                result |= self.indexes[field].get(item, set())
+            return result
+        return self.indexes[field].get(value, set())
+
+    def query_ids(self, category=None, strength=None, idol_type=None, idol_rarity=None, railcolor=None):
+        """返回满足所有条件的卡牌编号集合,未给出的条件不限制"""
+        candidate_sets = []
+        if category is not None and strength is not None:
+            # 类别和强度需要在同一排行中同时满足,给出列表时取各类别/强度组合的并集
+            categories = category if isinstance(category, (list, tuple, set)) else [category]
+            strengths = strength if isinstance(strength, (list, tuple, set)) else [strength]
+            ranked = set()
+            for c in categories:
+                for s in strengths:
+                    ranked |= self.rank_index.get((c, s), set())
+            candidate_sets.append(ranked)
+        else:
+            if category is not None:
+                candidate_sets.append(self._lookup('category', category))
+            if strength is not None:
+                candidate_sets.append(self._lookup('strength', strength))
+        for field, value in [('idol_type', idol_type), ('idol_rarity', idol_rarity), ('railcolor', railcolor)]:
+            if value is not None:
+                candidate_sets.append(self._lookup(field, value))
+        if not candidate_sets:
+            return set(range(len(self.records)))
+        # 从最小的集合开始求交集
+        candidate_sets.sort(key=len)
+        result = set(candidate_sets[0])
+        for ids in candidate_sets[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def query_names(self, **filters):
+        return {self.records[card_id]['card_name'] for card_id in self.query_ids(**filters)}
+
+    def query(self, **filters):
+        """返回满足条件的卡牌信息列表,按目录顺序"""
+        return [self.records[card_id] for card_id in sorted(self.query_ids(**filters))]
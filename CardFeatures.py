@@ -0,0 +1,59 @@
+import os
+
+"""
+卡牌图像预处理和识别特征,MhtmlDataExtra导出时预计算和ScreenTheCard加载时计算共用同一套流程,
+保证两边生成的特征缓存完全一致
+"""
+FEATURE_CACHE_VERSION = 3  # 特征缓存格式(基于标准化灰度图): {'version', 'features': {卡牌名: (关键点坐标, 描述子)}}
+CANONICAL_WIDTH = 256  # 标准化后的卡牌宽度,高度按比例缩放
+
+
+def feature_cache_path(db_path):
+    """CardRank.xlsx 对应的特征缓存 CardRank_features.pkl"""
+    return os.path.splitext(db_path)[0] + "_features.pkl"
+
+
+def load_gray(image_path):
+    """读取图像并转为灰度,兼容带透明通道的PNG"""
+    import numpy as np
+    from PIL import Image
+    with Image.open(image_path) as pil_img:
+        return np.array(pil_img.convert('L'))
+
+
+def normalize_gray(img_gray, width=CANONICAL_WIDTH):
+    """缩放到标准宽度,保持长宽比"""
+    import cv2
+    height, src_width = img_gray.shape[:2]
+    if src_width == width:
+        return img_gray
+    new_height = max(1, round(height * width / src_width))
+    interpolation = cv2.INTER_AREA if src_width > width else cv2.INTER_LINEAR
+    return cv2.resize(img_gray, (width, new_height), interpolation=interpolation)
+
+
+def orb_features(orb, img_gray):
+    """ORB关键点坐标和描述子,cv2.KeyPoint无法pickle,只保存坐标用于几何验证"""
+    import numpy as np
+    kps, des = orb.detectAndCompute(img_gray, None)
+    if des is None:
+        return None
+    return np.float32([kp.pt for kp in kps]), des
+
+
+MATCH_CHUNK_ROWS = (1 << 18) - 1  # OpenCV BFMatcher的单个训练矩阵行数必须小于2^18
+
+
+def nearest_descriptors(bf, des1, descriptors, owners):
+    """截图每个描述子在descriptors中的最近邻距离和所属卡牌编号
+    训练矩阵按MATCH_CHUNK_ROWS分块匹配后取最小值,卡牌库再大也不会超出OpenCV的行数限制"""
+    import numpy as np
+    distances = np.full(len(des1), np.inf, dtype=np.float32)
+    owner_ids = np.full(len(des1), -1, dtype=np.int32)
+    for start in range(0, len(descriptors), MATCH_CHUNK_ROWS):
+        chunk = descriptors[start:start + MATCH_CHUNK_ROWS]
+        for m in bf.match(des1, chunk):
+            if m.distance < distances[m.queryIdx]:
+                distances[m.queryIdx] = m.distance
+                owner_ids[m.queryIdx] = owners[start + m.trainIdx]
+    return distances, owner_ids
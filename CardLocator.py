@@ -0,0 +1,101 @@
+"""
+卡牌自动定位: 在截图中用边缘和轮廓检测找出卡牌矩形,代替按行列等分,
+避免把卡牌间隙、标题栏等空白区域送去匹配
+"""
+MIN_AREA_RATIO = 0.005  # 卡牌面积占截图面积的最小比例
+MIN_SIDE = 32  # 卡牌最短边像素
+ASPECT_RANGE = (0.5, 2.0)  # 宽高比范围
+RECTANGULARITY = 0.85  # 轮廓面积与外接矩形面积之比,低于此值不是矩形
+DUPLICATE_IOU = 0.7  # 重叠度高于此值视为同一张卡(边框内外两条轮廓)
+SIZE_TOLERANCE = 0.5  # 与卡牌面积中位数的偏离容忍度,过滤标题和图标等
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _iou(a, b):
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / (_area(a) + _area(b) - inter)
+
+
+def locate_card_regions(image):
+    """返回按行优先排序的 [(行, 列, (left, upper, right, lower))],未找到卡牌时返回空列表"""
+    import cv2
+    import numpy as np
+    img = np.array(image.convert('L'))
+    height, width = img.shape[:2]
+    blurred = cv2.GaussianBlur(img, (3, 3), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    # 只做很小的闭运算连接边框断点,核大小随截图尺寸缩放,避免把相邻卡牌或标题栏连成一片
+    size = max(3, (min(width, height) // 300) | 1)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+    edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+    # RETR_LIST保留所有层级的轮廓,与其他区域粘连的卡牌也能通过内侧轮廓找到
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    min_area = width * height * MIN_AREA_RATIO
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w < MIN_SIDE or h < MIN_SIDE or w * h < min_area:
+            continue
+        if not ASPECT_RANGE[0] <= w / h <= ASPECT_RANGE[1]:
+            continue
+        if cv2.contourArea(contour) < RECTANGULARITY * w * h:
+            continue
+        boxes.append((x, y, x + w, y + h))
+    if not boxes:
+        return []
+    # 同一边框的内外轮廓只保留较大的一个
+    boxes.sort(key=_area, reverse=True)
+    unique = []
+    for box in boxes:
+        if all(_iou(box, other) < DUPLICATE_IOU for other in unique):
+            unique.append(box)
+    # 包含两个以上候选的是卡牌组或整个截图,不是单张卡
+    boxes = [box for box in unique
+             if sum(1 for other in unique if other != box and _contains(box, other)) < 2]
+    # 去掉被其他候选包含的矩形(卡面内部图案)
+    boxes = [box for box in boxes if not any(other != box and _contains(other, box) for other in boxes)]
+    if not boxes:
+        return []
+    # 卡牌大小基本一致,过滤与中位数面积差距过大的矩形
+    areas = np.array([_area(box) for box in boxes])
+    median = float(np.median(areas))
+    boxes = [box for box, area in zip(boxes, areas)
+             if median * (1 - SIZE_TOLERANCE) <= area <= median / (1 - SIZE_TOLERANCE)]
+
+    # 按中心点纵坐标分行,按所有行的中心点横坐标分列,某张卡未检出时同一行后面的卡牌列号不变
+    median_height = float(np.median([b - t for _, t, _, b in boxes]))
+    median_width = float(np.median([r - l for l, _, r, _ in boxes]))
+    columns = []
+    for center in sorted((box[0] + box[2]) / 2 for box in boxes):
+        if columns and abs(center - columns[-1][0]) < median_width / 2:
+            columns[-1][1].append(center)
+        else:
+            columns.append([center, [center]])
+    column_centers = [float(np.mean(centers)) for _, centers in columns]
+    boxes.sort(key=lambda box: (box[1] + box[3]) / 2)
+    rows = []
+    for box in boxes:
+        center = (box[1] + box[3]) / 2
+        if rows and abs(center - rows[-1][0]) < median_height / 2:
+            rows[-1][1].append(box)
+        else:
+            rows.append([center, [box]])
+    regions = []
+    for row_idx, (_, row_boxes) in enumerate(rows):
+        for box in sorted(row_boxes):
+            center = (box[0] + box[2]) / 2
+            col_idx = min(range(len(column_centers)), key=lambda i: abs(column_centers[i] - center))
+            regions.append((row_idx, col_idx, box))
+    return regions
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pandas as pd
+
+from MhtmlDataExtra import extract_data, merge_card_ranks, parse_mhtml
+
+"""
+MhtmlDataExtra性能和正确性基准: 生成不同规模的模拟wiki排行MHTML(或使用录制的MHTML),
+分别统计parse_mhtml/extract_data/merge_card_ranks的耗时、峰值内存和卡牌数量,并与标准输出比对
+用法示例:
+python ExtractBenchmark.py                                    # 模拟页面 small/medium/large
+python ExtractBenchmark.py --sizes large --repeat 3
+python ExtractBenchmark.py --mhtml 卡牌排行.mhtml --golden golden.json --update-golden
+python ExtractBenchmark.py --mhtml 卡牌排行.mhtml --golden golden.json
+"""
+
+# 模拟页面规模: 表格数, 每表行数(强度等级), 每格卡牌数
+SIZES = {
+    'small': (2, 4, 2),
+    'medium': (6, 8, 4),
+    'large': (12, 12, 8),
+}
+CATEGORIES = ['通常排行', '对决排行', '副榜排行']
+HEADERS = ['得分', '辅助', '支援']
+ATTRIBUTES = ['歌唱', '舞蹈', '表演']
+RAIL_STYLES = {
+    '歌唱-红轨': 'background:#FFF0F5',
+    '舞蹈-蓝轨': 'background:#E0FFFF',
+    '表演-黄轨': 'background:#FFFFE0',
+    '无限制': 'background:#FFFFFF',
+}
+COMPARE_COLUMNS = ['category', 'strength', 'tableheader', 'railcolor', 'card_name', 'idol_type', 'idol_rarity']
+IMAGE_URL = "https://patchwiki.biligame.com/images/idolypride/{}.png"
+
+
+def make_png(seed):
+    """生成一个1x1的PNG,颜色由seed决定,保证每张卡图内容不同"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    pixel = bytes([0, seed % 256, (seed // 256) % 256, (seed // 65536) % 256])
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(pixel))
+            + chunk(b'IEND', b''))
+
+
+def generate_mhtml(mhtml_path, num_tables, num_rows, cards_per_cell, seed=0):
+    """生成与wiki卡牌排行页面结构一致的MHTML,返回预期提取结果"""
+    rng = random.Random(seed)
+    # 卡池大小小于卡牌出现次数,使同一张卡出现在多个排行中,覆盖合并逻辑
+    pool_size = max(1, num_tables * num_rows * len(HEADERS) * cards_per_cell // 2)
+    pool = [(f"卡牌{idx:05d}", rng.choice(HEADERS), rng.choice(ATTRIBUTES)) for idx in range(pool_size)]
+    expected = []
+    html = ['<html><head><meta charset="utf-8"></head><body>']
+    for table_idx in range(num_tables):
+        category = CATEGORIES[table_idx % len(CATEGORIES)]
+        if table_idx >= len(CATEGORIES):
+            category += str(table_idx // len(CATEGORIES))
+        html.append(f'<h2><span class="mw-editsection"></span><span class="mw-headline">{category}</span></h2>')
+        html.append('<table class="wikitable"><tr><th></th>' + ''.join(f'<th>{h}</th>' for h in HEADERS) + '</tr>')
+        for row_idx in range(num_rows):
+            strength = f"T{row_idx // 2}" if row_idx % 2 == 0 else f"T{row_idx // 2}.5"
+            cells = [f'<td>{strength}</td>']
+            for header in HEADERS:
+                railcolor = rng.choice(list(RAIL_STYLES))
+                spans = []
+                for name, idol_type, attribute in rng.sample(pool, min(cards_per_cell, len(pool))):
+                    spans.append(
+                        f'<span><a><img alt="{name}_small1.png" src="{IMAGE_URL.format(name)}"></a>'
+                        f'<img alt="Icon-{idol_type}.png" src="{IMAGE_URL.format("type-" + idol_type)}">'
+                        f'<img alt="Icon-{attribute}.png" src="{IMAGE_URL.format("attr-" + attribute)}"></span>'
+                    )
+                    expected.append({
+                        'category': category, 'strength': strength, 'tableheader': header,
+                        'railcolor': railcolor, 'card_name': f"{name}.png",
+                        'idol_type': idol_type, 'idol_rarity': attribute
+                    })
+                cells.append(f'<td style="{RAIL_STYLES[railcolor]}">' + ''.join(spans) + '</td>')
+            html.append('<tr>' + ''.join(cells) + '</tr>')
+        html.append('</table>')
+    html.append('</body></html>')
+
+    msg = MIMEMultipart('related', type='text/html')
+    msg['Date'] = 'Sun, 01 Jun 2025 12:00:00 +0800'
+    page = MIMEText(''.join(html), 'html', 'utf-8')
+    page['Content-Location'] = 'https://wiki.biligame.com/idolypride/%E5%8D%A1%E7%89%8C%E6%8E%92%E8%A1%8C'
+    msg.attach(page)
+    image_names = [name for name, _, _ in pool]
+    image_names += ["type-" + h for h in HEADERS] + ["attr-" + a for a in ATTRIBUTES]
+    for idx, name in enumerate(image_names):
+        image = MIMEImage(make_png(idx + 1), 'png')
+        image['Content-Location'] = IMAGE_URL.format(name)
+        msg.attach(image)
+    with open(mhtml_path, 'wb') as f:
+        f.write(msg.as_bytes())
+    return expected
+
+
+def timed(func, *args):
+    """运行一次并返回(结果, 耗时秒),不开启tracemalloc以免拖慢计时"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def traced_peak(func, *args):
+    """单独运行一次并返回峰值内存MB"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def card_rows(card_data):
+    """用于比对的卡牌记录,忽略与输出目录相关的card_path"""
+    return [tuple(str(card[col]) for col in COMPARE_COLUMNS) for card in card_data]
+
+
+def compare(actual, expected):
+    """返回(缺失条数, 多出条数),两者都为0表示一致"""
+    actual_rows, expected_rows = Counter(card_rows(actual)), Counter(card_rows(expected))
+    return sum((expected_rows - actual_rows).values()), sum((actual_rows - expected_rows).values())
+
+
+def run_case(name, mhtml_path, expected, repeat):
+    """对单个MHTML运行各阶段: 计时取repeat次中最快的一次,峰值内存在单独一次追踪运行中统计"""
+    stats = {'case': name}
+    for stage in ['parse', 'extract', 'merge']:
+        stats[f'{stage}_s'] = float('inf')
+    for _ in range(repeat):
+        output_dir = tempfile.mkdtemp(prefix="extract_bench_")
+        try:
+            # 每个阶段使用新的输出目录,避免图片已存在时跳过写入
+            _, parse_s = timed(parse_mhtml, mhtml_path, os.path.join(output_dir, "parse"))
+            card_data, extract_s = timed(extract_data, mhtml_path, os.path.join(output_dir, "extract"))
+            merged, merge_s = timed(merge_card_ranks, pd.DataFrame(card_data))
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        for stage, seconds in [('parse', parse_s), ('extract', extract_s), ('merge', merge_s)]:
+            stats[f'{stage}_s'] = min(stats[f'{stage}_s'], seconds)
+    output_dir = tempfile.mkdtemp(prefix="extract_bench_")
+    try:
+        stats['parse_mb'] = traced_peak(parse_mhtml, mhtml_path, os.path.join(output_dir, "parse"))
+        stats['extract_mb'] = traced_peak(extract_data, mhtml_path, os.path.join(output_dir, "extract"))
+        stats['merge_mb'] = traced_peak(merge_card_ranks, pd.DataFrame(card_data))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    stats['cards'] = len(card_data)
+    stats['unique'] = len(merged)
+    if expected is not None:
+        stats['missing'], stats['extra'] = compare(card_data, expected)
+        expected_unique = len({card['card_name'] for card in expected})
+        stats['merge_ok'] = len(merged) == expected_unique
+    return stats, card_data
+
+
+def print_report(all_stats):
+    print(f"{'case':<12}{'parse s':>9}{'MB':>7}{'extract s':>11}{'MB':>7}{'merge s':>9}{'MB':>7}"
+          f"{'cards':>8}{'unique':>8}{'missing':>9}{'extra':>7}{'merge':>7}")
+    for s in all_stats:
+        merge_ok = s.get('merge_ok')
+        print(f"{s['case']:<12}{s['parse_s']:>9.3f}{s['parse_mb']:>7.1f}{s['extract_s']:>11.3f}{s['extract_mb']:>7.1f}"
+              f"{s['merge_s']:>9.3f}{s['merge_mb']:>7.1f}{s['cards']:>8}{s['unique']:>8}"
+              f"{s.get('missing', '-'):>9}{s.get('extra', '-'):>7}"
+              f"{'-' if merge_ok is None else ('ok' if merge_ok else 'FAIL'):>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MhtmlDataExtra提取基准")
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES), help="模拟页面规模")
+    parser.add_argument("--mhtml", nargs="*", default=[], help="录制的wiki MHTML文件")
+    parser.add_argument("--golden", help="标准输出JSON,与录制的MHTML一一对应时使用单个文件")
+    parser.add_argument("--update-golden", action="store_true", help="用本次提取结果覆盖标准输出")
+    parser.add_argument("--repeat", type=int, default=1, help="每个用例重复次数,取最快一次")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    golden = {}
+    if args.golden and os.path.exists(args.golden) and not args.update_golden:
+        with open(args.golden, 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+
+    all_stats = []
+    new_golden = {}
+    work_dir = tempfile.mkdtemp(prefix="extract_bench_mhtml_")
+    try:
+        for size in args.sizes:
+            mhtml_path = os.path.join(work_dir, f"{size}.mhtml")
+            expected = generate_mhtml(mhtml_path, *SIZES[size], seed=args.seed)
+            stats, _ = run_case(size, mhtml_path, expected, args.repeat)
+            all_stats.append(stats)
+        for mhtml_path in args.mhtml:
+            name = os.path.splitext(os.path.basename(mhtml_path))[0]
+            stats, card_data = run_case(name, mhtml_path, golden.get(name), args.repeat)
+            all_stats.append(stats)
+            new_golden[name] = [{col: str(card[col]) for col in COMPARE_COLUMNS} for card in card_data]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(all_stats)
+    if args.golden and args.update_golden:
+        with open(args.golden, 'w', encoding='utf-8') as f:
+            json.dump(new_golden, f, ensure_ascii=False, indent=1)
+        print(f"标准输出已更新: {args.golden}")
+    failed = [s['case'] for s in all_stats if s.get('missing') or s.get('extra') or s.get('merge_ok') is False]
+    if failed:
+        print(f"提取结果与标准输出不一致: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
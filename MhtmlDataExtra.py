@@ -1,11 +1,23 @@
+import argparse
 import email
 import os
+import pickle
 import re
 import shutil
+import sys
+import time
+import traceback
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from email import policy
+from email.parser import BytesHeaderParser
+from email.utils import parsedate_to_datetime
 from urllib.parse import unquote, urlparse
 from bs4 import BeautifulSoup
+from CardFeatures import (
+    FEATURE_CACHE_VERSION, feature_cache_path, load_gray, normalize_gray, orb_features
+)
 
 """
 首先打开wiki官网排行榜然后右键另存为mhtml文件再使用程序处理
@@ -51,9 +63,11 @@ def parse_mhtml(mhtml_path, output_dir):
                 save_path = os.path.join(resource_dir, filename)
                 # 检查文件是否已存在
                 if not os.path.exists(save_path):
-                    # 写入文件
-                    with open(save_path, 'wb') as f:
+                    # 写入文件(先写临时文件再替换,批量并行时不会读到半截文件)
+                    tmp_path = f"{save_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'wb') as f:
                         f.write(payload)
+                    os.replace(tmp_path, save_path)
                 # 记录保存路径
                 if content_location:
                     resource_map[content_location] = save_path
@@ -148,7 +162,9 @@ def extract_data(mhtml_path, output_dir):
                             save_path = os.path.join(card_dir, card_name)
                             # 复制文件
                             if not os.path.exists(save_path):
-                                shutil.copy2(img_path, save_path)
+                                tmp_path = f"{save_path}.{os.getpid()}.tmp"
+                                shutil.copy2(img_path, tmp_path)
+                                os.replace(tmp_path, save_path)
                             card_path = save_path
 
                     # 添加到数据列表
@@ -165,10 +181,137 @@ def extract_data(mhtml_path, output_dir):
                         })
     return card_data
 
+"""读取MHTML头部的保存时间作为快照日期,没有则使用文件修改时间"""
+def get_snapshot_date(mhtml_path):
+    with open(mhtml_path, 'rb') as f:
+        headers = BytesHeaderParser(policy=policy.default).parse(f)
+    date_header = headers.get('Date')
+    if date_header:
+        try:
+            return parsedate_to_datetime(str(date_header)).strftime('%Y-%m-%d %H:%M:%S')
+        except (TypeError, ValueError):
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(mhtml_path)).strftime('%Y-%m-%d %H:%M:%S')
+
+"""批量模式的单文件任务,在子进程中运行,异常作为结果返回而不是抛出"""
+def _extract_snapshot(mhtml_path, output_dir, snapshot):
+    start = time.perf_counter()
+    try:
+        snapshot_date = get_snapshot_date(mhtml_path)
+        card_data = extract_data(mhtml_path, output_dir)
+        for card in card_data:
+            card['snapshot'] = snapshot
+            card['snapshot_date'] = snapshot_date
+        return mhtml_path, card_data, time.perf_counter() - start, None
+    except Exception:
+        return mhtml_path, [], time.perf_counter() - start, traceback.format_exc()
+
+"""收集批量输入: 支持文件列表和目录(目录下所有.mhtml/.mht文件)"""
+def collect_mhtml_paths(inputs):
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    mhtml_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if name.lower().endswith(('.mhtml', '.mht')):
+                    mhtml_paths.append(os.path.join(item, name))
+        else:
+            mhtml_paths.append(item)
+    return mhtml_paths
+
+"""为每个文件生成唯一的快照名: 默认用文件名,同名文件(如不同日期目录下的同一页面)加上所在目录名,仍重复时加序号"""
+def make_snapshot_ids(mhtml_paths):
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in mhtml_paths]
+    snapshot_ids = []
+    for path, stem in zip(mhtml_paths, stems):
+        if stems.count(stem) > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem = f"{parent}/{stem}"
+        snapshot_ids.append(stem)
+    seen = {}
+    for idx, snapshot in enumerate(snapshot_ids):
+        if snapshot in seen:
+            seen[snapshot] += 1
+            snapshot_ids[idx] = f"{snapshot}#{seen[snapshot]}"
+        else:
+            seen[snapshot] = 1
+    return snapshot_ids
+
+"""批量解析多个MHTML快照,进程池并行,共用同一图片输出目录,单个文件失败不中断整批"""
+def extract_batch(inputs, output_dir, max_workers=None):
+    mhtml_paths = collect_mhtml_paths(inputs)
+    os.makedirs(output_dir, exist_ok=True)
+    card_data = []
+    report = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_extract_snapshot, path, output_dir, snapshot): (path, snapshot)
+            for path, snapshot in zip(mhtml_paths, make_snapshot_ids(mhtml_paths))
+        }
+        for future in as_completed(futures):
+            mhtml_path, snapshot = futures[future]
+            try:
+                mhtml_path, cards, elapsed, error = future.result()
+            except Exception:
+                # 子进程异常退出(BrokenProcessPool等)时记为该文件失败,继续收集其余结果
+                cards, elapsed, error = [], 0.0, traceback.format_exc()
+            report.append({
+                'mhtml_path': mhtml_path,
+                'snapshot': snapshot,
+                'cards': len(cards),
+                'seconds': round(elapsed, 3),
+                'error': error.strip().splitlines()[-1] if error else ''
+            })
+            if error:
+                print(f"提取失败 {mhtml_path} ({elapsed:.2f}s):\n{error}")
+            else:
+                print(f"提取完成 {mhtml_path}: {len(cards)} 条 ({elapsed:.2f}s)")
+            card_data.extend(cards)
+    # 按快照时间排序,保证输出顺序稳定
+    card_data.sort(key=lambda card: (card['snapshot_date'], card['snapshot']))
+    report.sort(key=lambda item: item['mhtml_path'])
+    failed = sum(1 for item in report if item['error'])
+    print(f"批量提取结束: {len(mhtml_paths)} 个文件, 失败 {failed} 个, "
+          f"共 {len(card_data)} 条卡牌数据, 耗时 {time.perf_counter() - start:.2f}s")
+    return card_data, report
+
+"""可选的导出后处理: 写出标准尺寸灰度卡图,并预计算识别特征(关键点+描述子)
+结果保存为CardRank对应的特征缓存,识别端加载CardRank时不再需要解码图片和计算特征"""
+def precompute_card_artefacts(rank_df, output_dir, rank_path):
+    import cv2
+    from PIL import Image
+    norm_dir = os.path.join(output_dir, "card_norm")
+    os.makedirs(norm_dir, exist_ok=True)
+    orb = cv2.ORB_create()
+    features = {}
+    for _, row in rank_df.iterrows():
+        card_name = row['card_name']
+        try:
+            img_gray = normalize_gray(load_gray(row['card_path']))
+        except Exception as e:
+            print(f"卡图读取失败: {row['card_path']} - {str(e)}")
+            continue
+        # cv2.imwrite不支持中文路径,用PIL保存
+        Image.fromarray(img_gray).save(os.path.join(norm_dir, card_name))
+        card_features = orb_features(orb, img_gray)
+        if card_features is not None:
+            features[card_name] = card_features
+    cache_path = feature_cache_path(rank_path)
+    with open(cache_path, 'wb') as f:
+        pickle.dump({'version': FEATURE_CACHE_VERSION, 'features': features}, f)
+    print(f"识别特征已预计算: {len(features)} 张卡牌 -> {cache_path}")
+    return features
+
 """将卡牌数据保存到Excel文件"""
 def save_excel(card_data, output_path):
-    df = pd.DataFrame(card_data)
-    df = df[['category', 'strength', 'tableheader', 'railcolor', 'card_name', 'idol_type', 'idol_rarity', 'card_path']]
+    columns = ['category', 'strength', 'tableheader', 'railcolor', 'card_name', 'idol_type', 'idol_rarity', 'card_path']
+    # 没有数据(如批量全部失败)时仍写出只有表头的文件
+    df = pd.DataFrame(card_data) if card_data else pd.DataFrame(columns=columns)
+    # 批量模式带有快照标记
+    columns += [col for col in ['snapshot', 'snapshot_date'] if col in df.columns]
+    df = df[columns]
     df.to_excel(output_path, index=False)
     print(f"卡牌数据已保存到: {output_path}")
 
@@ -228,8 +371,29 @@ def merge_card_ranks(df):
     return pd.DataFrame(results)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="wiki卡牌排行MHTML数据导出")
+    parser.add_argument("output_dir", nargs="?", help="导出数据的文件夹")
+    parser.add_argument("inputs", nargs="*", help="批量模式: 快照1.mhtml 快照2.mhtml 或 快照文件夹")
+    parser.add_argument("--precompute", action="store_true",
+                        help="导出后预计算标准化卡图和识别特征(需要opencv)")
+    args = parser.parse_args()
+    precompute = args.precompute
+    # 批量模式: python MhtmlDataExtra.py 输出文件夹 快照1.mhtml 快照2.mhtml 或 快照文件夹
+    if args.inputs:
+        output_dir = args.output_dir
+        card_data, report = extract_batch(args.inputs, output_dir)
+        pd.DataFrame(report).to_excel(os.path.join(output_dir, "BatchReport.xlsx"), index=False)
+        save_excel(card_data, os.path.join(output_dir, "CardDataSnapshots.xlsx"))
+        if precompute and card_data:
+            # 按快照时间顺序合并,每张卡保留最新的排行,作为识别端使用的CardRank
+            df = pd.DataFrame(card_data).drop(columns=['snapshot', 'snapshot_date'])
+            result_df = merge_card_ranks(df)
+            output_path = os.path.join(output_dir, "CardRank.xlsx")
+            result_df.to_excel(output_path, index=False)
+            precompute_card_artefacts(result_df, output_dir, output_path)
+        sys.exit(0)
     mhtml_path = "网页文件地址.mhtml"
-    output_dir = "导出数据的文件夹"
+    output_dir = args.output_dir or "导出数据的文件夹"
     # 提取卡牌数据
     card_data = extract_data(mhtml_path, output_dir)
     print(f"成功提取 {len(card_data)} 条卡牌数据")
@@ -241,4 +405,6 @@ if __name__ == "__main__":
     result_df = merge_card_ranks(df)
     output_path = output_dir + "\CardRank.xlsx"
     result_df.to_excel(output_path, index=False)
-    print("卡牌排行数据保存成功")
\ No newline at end of file
+    print("卡牌排行数据保存成功")
+    if precompute:
+        precompute_card_artefacts(result_df, output_dir, output_path)
\ No newline at end of file
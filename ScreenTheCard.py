@@ -1,53 +1,71 @@
+import time
+_START_TIME = time.perf_counter()  # 启动计时起点
 import sys
-import cv2
-import numpy as np
-import pandas as pd
-import pyautogui
-from PIL import Image
 import os
 import pickle
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QSpinBox,
     QVBoxLayout, QHBoxLayout, QWidget, QGridLayout,
-    QMessageBox, QFileDialog, QCheckBox, QScrollArea
+    QMessageBox, QFileDialog, QCheckBox, QScrollArea, QProgressBar, QComboBox
 )
-from PyQt5.QtCore import Qt, QPoint, QRect, pyqtSignal, QSize, QObject
+from PyQt5.QtCore import Qt, QPoint, QRect, pyqtSignal, QSize, QObject, QThread, QTimer, QSettings
 from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap, QImage, QFont
+from CardCatalog import CardCatalog
+from CardLocator import locate_card_regions
+from CardFeatures import (
+    FEATURE_CACHE_VERSION, feature_cache_path, load_gray, nearest_descriptors, normalize_gray, orb_features
+)
+_IMPORT_TIME = time.perf_counter() - _START_TIME  # 界面模块导入耗时
 
 """
 请先运行MhtmlDataExtra程序导出网页卡牌数据,用于该程序的图片识别匹配
+cv2/numpy/pandas/PIL/pyautogui 均在首次使用时才导入,保证主窗口尽快显示
 """
 class CardRecognizer:
-    def __init__(self, card_db_path, error_callback=None):
+    SHORTLIST_SIZE = 5  # 进入几何验证的候选卡牌数
+    VOTE_DISTANCE = 64  # 粗筛投票时描述子汉明距离上限
+    RATIO_TEST = 0.75  # kNN比值测试阈值
+    RANSAC_THRESHOLD = 5.0  # 单应性RANSAC重投影误差(像素)
+    MIN_INLIERS = 10  # 内点数低于此值视为未匹配到卡牌
+
+    def __init__(self, card_db_path, error_callback=None, progress_callback=None, num_shards=1,
+                 cancel_callback=None):
+        import cv2
         self.orb = cv2.ORB_create()
         self.error_callback = error_callback  # 错误回调函数
+        self.progress_callback = progress_callback  # 加载进度回调函数(当前, 总数)
+        self.num_shards = num_shards  # 大于1时粗筛使用多进程分片匹配
+        self.cancel_callback = cancel_callback  # 返回True时中止特征计算
+        self.sharded_matcher = None
         self.card_features, self.card_db = self.load_card_database(card_db_path)
+        # 卡牌目录,用于按名称取卡牌信息和按条件缩小候选范围
+        self.catalog = CardCatalog.from_dataframe(self.card_db)
+        self.build_match_index()
 
     def report_error(self, message):
         """报告错误到回调函数"""
         if self.error_callback:
             self.error_callback(message)
 
+    def report_progress(self, current, total):
+        """报告加载进度到回调函数"""
+        if self.progress_callback:
+            self.progress_callback(current, total)
+
     def compute_image_features(self, image_path):
         if not os.path.exists(image_path):
             self.report_error(f"路径下图像不存在: {image_path}")
             return None
         try:
-            pil_img = Image.open(image_path)
-            img_array = np.array(pil_img)
-            if len(img_array.shape) == 2:
-                img_gray = img_array
-            else:
-                img_gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-
-            _, des = self.orb.detectAndCompute(img_gray, None)
-            return des
+            # 与MhtmlDataExtra预计算使用相同的灰度化和标准尺寸
+            return orb_features(self.orb, normalize_gray(load_gray(image_path)))
         except Exception as e:
             self.report_error(f"路径下图像读取失败: {image_path} - {str(e)}")
             return None
 
     def load_card_database(self, db_path):
-        cache_path = os.path.splitext(db_path)[0] + "_features.pkl"
+        import pandas as pd
+        cache_path = feature_cache_path(db_path)
         try:
             df = pd.read_excel(db_path)
         except Exception as e:
@@ -57,27 +75,129 @@ class CardRecognizer:
             try:
                 with open(cache_path, 'rb') as f:
                     features_cache = pickle.load(f)
-                return features_cache, df
+                # 旧版缓存只有描述子,需要重新计算
+                if isinstance(features_cache, dict) and features_cache.get('version') == FEATURE_CACHE_VERSION:
+                    return features_cache['features'], df
+                self.report_error("特征缓存版本过旧,重新计算特征")
             except Exception as e:
                 self.report_error(f"特征缓存加载失败: {str(e)}")
                 return {}, pd.DataFrame()
         new_features = {}
-        for idx, row in df.iterrows():
+        total = len(df)
+        for idx, (_, row) in enumerate(df.iterrows()):
+            if self.cancel_callback and self.cancel_callback():
+                # 取消加载时不写缓存,避免留下不完整的特征
+                return {}, pd.DataFrame()
             card_name = row['card_name']
             card_path = row['card_path']
-            des = self.compute_image_features(card_path)
-            if des is not None:
-                new_features[card_name] = des
+            features = self.compute_image_features(card_path)
+            if features is not None:
+                new_features[card_name] = features
+            self.report_progress(idx + 1, total)
         if new_features:
             try:
                 with open(cache_path, 'wb') as f:
-                    pickle.dump(new_features, f)
+                    pickle.dump({'version': FEATURE_CACHE_VERSION, 'features': new_features}, f)
             except Exception as e:
                 self.report_error(f"特征保存失败: {str(e)}")
                 return {}, pd.DataFrame()
         return new_features, df
 
-    def find_card_match(self, card_image):
+    def build_match_index(self):
+        """把所有卡牌描述子拼成一个矩阵,粗筛时一次匹配即可对全部卡牌投票"""
+        import numpy as np
+        self.card_names = []
+        des_list = []
+        owners = []
+        for card_name, (points, des) in self.card_features.items():
+            if des is None or len(des) < 3:
+                continue
+            owners.append(np.full(len(des), len(self.card_names), dtype=np.int32))
+            des_list.append(des)
+            self.card_names.append(card_name)
+        self.name_to_index = {name: idx for idx, name in enumerate(self.card_names)}
+        if des_list:
+            self.all_descriptors = np.vstack(des_list)
+            self.descriptor_owner = np.concatenate(owners)
+        else:
+            self.all_descriptors = None
+            self.descriptor_owner = None
+        if self.num_shards > 1 and self.all_descriptors is not None:
+            from ShardedMatcher import ShardedMatcher
+            try:
+                self.sharded_matcher = ShardedMatcher(self.all_descriptors, self.descriptor_owner, self.num_shards)
+            except Exception as e:
+                self.report_error(f"分片进程启动失败,改用单进程匹配: {str(e)}")
+                self.sharded_matcher = None
+
+    def close(self):
+        """结束分片匹配进程并释放共享内存"""
+        if self.sharded_matcher is not None:
+            self.sharded_matcher.close()
+            self.sharded_matcher = None
+
+    def nearest_owners(self, des1):
+        """截图每个描述子在全库中的最近邻距离和所属卡牌编号"""
+        import cv2
+        if self.sharded_matcher is not None:
+            try:
+                distances, owner_ids, errors = self.sharded_matcher.nearest(des1)
+            except (TimeoutError, RuntimeError) as e:
+                # 分片进程异常时关闭分片匹配,之后的查询改为单进程,避免每次都等到超时
+                self.report_error(f"分片匹配失败,改用单进程匹配: {str(e)}")
+                self.close()
+            else:
+                for error in errors:
+                    self.report_error(f"匹配过程出错: {error}")
+                return distances, owner_ids
+        bf = cv2.BFMatcher(cv2.NORM_HAMMING)
+        return nearest_descriptors(bf, des1, self.all_descriptors, self.descriptor_owner)
+
+    def shortlist(self, des1, candidates=None):
+        """粗筛: 截图每个描述子在全库中找最近邻,按所属卡牌投票,返回 [(卡牌名, 票数)]"""
+        import numpy as np
+        if self.all_descriptors is None:
+            return []
+        distances, owner_ids = self.nearest_owners(des1)
+        voted = owner_ids[(distances < self.VOTE_DISTANCE) & (owner_ids >= 0)]
+        votes = np.bincount(voted, minlength=len(self.card_names))
+        if candidates is not None:
+            mask = np.zeros(len(self.card_names), dtype=bool)
+            for name in candidates:
+                idx = self.name_to_index.get(name)
+                if idx is not None:
+                    mask[idx] = True
+            votes = np.where(mask, votes, -1)
+        order = np.argsort(-votes, kind='stable')[:self.SHORTLIST_SIZE]
+        return [(self.card_names[idx], int(votes[idx])) for idx in order if votes[idx] >= 0]
+
+    def verify(self, kp1, des1, card_name):
+        """几何验证: kNN比值测试后用RANSAC估计单应性,返回内点数"""
+        import cv2
+        import numpy as np
+        points2, des2 = self.card_features[card_name]
+        bf = cv2.BFMatcher(cv2.NORM_HAMMING)
+        knn_matches = bf.knnMatch(des1, des2, k=2)
+        good = [pair[0] for pair in knn_matches
+                if len(pair) == 2 and pair[0].distance < self.RATIO_TEST * pair[1].distance]
+        if len(good) < 4:
+            return 0
+        src = np.float32([kp1[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+        dst = points2[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+        _, mask = cv2.findHomography(src, dst, cv2.RANSAC, self.RANSAC_THRESHOLD)
+        return int(mask.sum()) if mask is not None else 0
+
+    def candidate_names(self, **filters):
+        """按类型/属性/轨道/排行筛选候选卡牌,参数同CardCatalog.query_ids"""
+        filters = {key: value for key, value in filters.items() if value}
+        if not filters:
+            return None
+        return self.catalog.query_names(**filters)
+
+    def find_card_match(self, card_image, candidates=None):
+        """candidates为卡牌名集合时只在这些卡牌中匹配"""
+        import cv2
+        import numpy as np
         try:
             # 提取截图图像内容
             card_array = np.array(card_image)
@@ -90,33 +210,67 @@ class CardRecognizer:
             if des1 is None or len(des1) < 3:
                 self.report_error("截取图像特征点过少")
                 return None
-            best_match = None
-            best_score = float('inf')
-            bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-            for card_name, des2 in self.card_features.items():
-                if des2 is None or len(des2) < 3:
-                    continue
+            # 粗筛候选后只对少数卡牌做几何验证,以RANSAC内点数作为置信度
+            shortlist = self.shortlist(des1, candidates)
+            if not any(votes > 0 for _, votes in shortlist):
+                return None
+            best_name, best_inliers = None, 0
+            for card_name, votes in shortlist:
                 try:
-                    matches = bf.match(des1, des2)
-                    if matches:
-                        match_score = sum(m.distance for m in matches) / len(matches)
-                        if match_score < best_score:
-                            best_score = match_score
-                            # 确保返回的是Series中的第一行数据
-                            matched_row = self.card_db[self.card_db['card_name'] == card_name]
-                            if not matched_row.empty:
-                                best_match = matched_row.iloc[0].to_dict()
+                    inliers = self.verify(kp1, des1, card_name)
                 except cv2.error as e:
                     self.report_error(f"匹配过程出错: {str(e)}")
                     continue
+                if inliers > best_inliers:
+                    best_name, best_inliers = card_name, inliers
+            # 没有候选通过几何验证时不返回票数最高的卡牌,避免误识别
+            if best_inliers < self.MIN_INLIERS:
+                return None
+            matched_row = self.catalog.get(best_name)
+            if matched_row is None:
+                return None
+            best_match = dict(matched_row)
+            best_match['confidence'] = best_inliers
             return best_match
         except Exception as e:
             self.report_error(f"识别过程崩溃: {str(e)}")
             return None
 
 
+class DatabaseLoader(QObject):
+    """在后台线程中构建CardRecognizer,避免读取Excel和计算特征时界面卡死"""
+    progress = pyqtSignal(int, int)
+    error = pyqtSignal(str)
+    finished = pyqtSignal(object, float)
+    def __init__(self, db_path, num_shards=1, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.num_shards = num_shards
+        self.cancelled = False
+        self.recognizer = None
+
+    def cancel(self):
+        """请求中止加载,特征计算循环在下一张卡牌前退出"""
+        self.cancelled = True
+
+    def run(self):
+        start = time.perf_counter()
+        recognizer = None
+        try:
+            recognizer = CardRecognizer(self.db_path, self.error.emit, self.progress.emit, self.num_shards,
+                                        lambda: self.cancelled)
+        except Exception as e:
+            self.error.emit(f"加载数据失败: {str(e)}")
+        if self.cancelled and recognizer is not None:
+            # 已取消时主窗口不再接收结果,在这里释放分片进程和共享内存
+            recognizer.close()
+            recognizer = None
+        self.recognizer = recognizer
+        self.finished.emit(recognizer, time.perf_counter() - start)
+
+
 class SnippingTool(QWidget):
-    finished = pyqtSignal(Image.Image, QRect)
+    finished = pyqtSignal(object, QRect)  # PIL.Image, 选区
     status_message = pyqtSignal(str)
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -161,6 +315,7 @@ class SnippingTool(QWidget):
                     self.mapToGlobal(rect.topLeft()),
                     self.mapToGlobal(rect.bottomRight())
                 )
+                import pyautogui
                 screenshot = pyautogui.screenshot(
                     region=(
                         global_rect.x(),
@@ -327,9 +482,18 @@ class CardStrengthGUI(QMainWindow):
         self.overlays = []
         self.grid_rows = 1
         self.grid_cols = 1
+        self.auto_locate = False
         self.show_overlays = True
         self.show_details = True
+        self.load_thread = None
+        self.load_worker = None
+        self.candidates = None
+        self.settings = QSettings("IdolPrideRankSystem", "ScreenTheCard")
         self.init_ui()
+        # 启动时自动加载上次使用的CardRank
+        last_path = self.settings.value("last_db_path", "", type=str)
+        if self.autoload_check.isChecked() and last_path and os.path.exists(last_path):
+            QTimer.singleShot(0, lambda: self.load_database(last_path))
 
     def init_ui(self):
         # 设置整个窗口的默认字体大小
@@ -349,6 +513,18 @@ class CardStrengthGUI(QMainWindow):
         self.select_db_btn = QPushButton("读取CardRank")
         self.select_db_btn.clicked.connect(self.select_database)
         db_layout.addWidget(self.select_db_btn)
+        # 启动时自动加载上次的数据
+        self.autoload_check = QCheckBox("自动加载")
+        self.autoload_check.setChecked(self.settings.value("auto_load", False, type=bool))
+        self.autoload_check.stateChanged.connect(self.toggle_autoload)
+        db_layout.addWidget(self.autoload_check)
+        # 分片匹配进程数,卡牌库很大时使用多核,加载数据时生效
+        db_layout.addWidget(QLabel("分片:"))
+        self.shard_spin = QSpinBox()
+        self.shard_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.shard_spin.setValue(self.settings.value("num_shards", 1, type=int))
+        self.shard_spin.valueChanged.connect(lambda value: self.settings.setValue("num_shards", value))
+        db_layout.addWidget(self.shard_spin)
         # 窗口置顶
         self.topmost_check = QCheckBox("置顶")
         self.topmost_check.setChecked(True)
@@ -367,6 +543,11 @@ class CardStrengthGUI(QMainWindow):
         self.col_spin.setRange(1, 5)
         self.col_spin.setValue(1)
         grid_layout.addWidget(self.col_spin)
+        # 截图中只有一种类型时可限定候选卡牌
+        grid_layout.addWidget(QLabel("类型:"))
+        self.type_combo = QComboBox()
+        self.type_combo.addItem("全部")
+        grid_layout.addWidget(self.type_combo)
         self.overlay_check = QCheckBox("悬浮信息")
         self.overlay_check.setChecked(True)
         self.overlay_check.stateChanged.connect(self.toggle_overlays)
@@ -375,6 +556,10 @@ class CardStrengthGUI(QMainWindow):
         self.details_check.setChecked(True)
         self.details_check.stateChanged.connect(self.toggle_details)
         grid_layout.addWidget(self.details_check)
+        # 自动定位卡牌位置,勾选后忽略行列设置
+        self.locate_check = QCheckBox("自动定位")
+        self.locate_check.setChecked(False)
+        grid_layout.addWidget(self.locate_check)
         main_layout.addLayout(grid_layout)
         # 截图按钮
         self.capture_btn = QPushButton("启动截图识别")
@@ -394,8 +579,20 @@ class CardStrengthGUI(QMainWindow):
         self.details_label.setAlignment(Qt.AlignCenter)
         self.details_label.setWordWrap(True)
         main_layout.addWidget(self.details_label)
+        # 数据加载进度条
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progress_bar)
         self.statusBar().showMessage("就绪")
 
+    def report_startup_time(self):
+        """在主窗口显示后报告导入耗时和首个窗口显示耗时"""
+        window_time = time.perf_counter() - _START_TIME
+        message = f"启动完成: 导入 {_IMPORT_TIME * 1000:.0f} ms, 首个窗口 {window_time * 1000:.0f} ms"
+        if not (self.load_thread and self.load_thread.isRunning()):
+            self.statusBar().showMessage(message)
+
     def recognizer_error(self, message):
         """处理识别器错误"""
         self.statusBar().showMessage(message)
@@ -405,17 +602,66 @@ class CardStrengthGUI(QMainWindow):
             self, "选择CardRank卡牌排行文件", "", "Excel 文件 (*.xlsx)"
         )
         if file_path:
-            self.db_path = file_path
-            self.db_label.setText(os.path.basename(file_path))
-            try:
-                # 创建识别器并传递错误处理回调
-                self.recognizer = CardRecognizer(file_path, self.recognizer_error)
-                self.capture_btn.setEnabled(True)
-                self.statusBar().showMessage(f"卡牌数据加载完成: {len(self.recognizer.card_features)} 张卡牌")
-                self.details_label.setText("")
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"加载数据失败: {str(e)}")
-                self.statusBar().showMessage("数据加载失败")
+            self.load_database(file_path)
+
+    def load_database(self, file_path):
+        """在后台线程中加载卡牌数据,主线程只负责显示进度"""
+        if self.load_thread and self.load_thread.isRunning():
+            return
+        self.db_path = file_path
+        self.db_label.setText(os.path.basename(file_path))
+        self.select_db_btn.setEnabled(False)
+        self.capture_btn.setEnabled(False)
+        self.progress_bar.setRange(0, 0)  # 总数未知前显示忙碌状态
+        self.progress_bar.setVisible(True)
+        self.statusBar().showMessage("正在加载卡牌数据...")
+        # 创建识别器并传递错误处理回调
+        self.load_thread = QThread(self)
+        self.load_worker = DatabaseLoader(file_path, self.shard_spin.value())
+        self.load_worker.moveToThread(self.load_thread)
+        self.load_thread.started.connect(self.load_worker.run)
+        self.load_worker.progress.connect(self.update_load_progress)
+        self.load_worker.error.connect(self.recognizer_error)
+        self.load_worker.finished.connect(self.database_loaded)
+        self.load_worker.finished.connect(self.load_thread.quit)
+        self.load_thread.finished.connect(self.load_worker.deleteLater)
+        self.load_thread.start()
+
+    def update_load_progress(self, current, total):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(current)
+        self.statusBar().showMessage(f"计算卡牌特征: {current}/{total}")
+
+    def database_loaded(self, recognizer, elapsed):
+        self.progress_bar.setVisible(False)
+        self.select_db_btn.setEnabled(True)
+        self.load_worker = None
+        if recognizer is None or not recognizer.card_features:
+            if recognizer is not None:
+                recognizer.close()
+            # 保留之前已加载的数据
+            self.capture_btn.setEnabled(self.recognizer is not None)
+            QMessageBox.critical(self, "错误", "加载数据失败")
+            self.statusBar().showMessage("数据加载失败")
+            return
+        # 加载完成后错误改为直接回报主窗口
+        recognizer.error_callback = self.recognizer_error
+        recognizer.progress_callback = None
+        if self.recognizer is not None:
+            self.recognizer.close()
+        self.recognizer = recognizer
+        self.type_combo.clear()
+        self.type_combo.addItem("全部")
+        self.type_combo.addItems(recognizer.catalog.values('idol_type'))
+        self.settings.setValue("last_db_path", self.db_path)
+        self.capture_btn.setEnabled(True)
+        self.statusBar().showMessage(
+            f"卡牌数据加载完成: {len(self.recognizer.card_features)} 张卡牌, 耗时 {elapsed:.2f} s"
+        )
+        self.details_label.setText("")
+
+    def toggle_autoload(self, state):
+        self.settings.setValue("auto_load", state == Qt.Checked)
 
     def start_snipping(self):
         if not self.recognizer:
@@ -427,8 +673,13 @@ class CardStrengthGUI(QMainWindow):
 
         self.grid_rows = self.row_spin.value()
         self.grid_cols = self.col_spin.value()
+        idol_type = self.type_combo.currentText()
+        self.candidates = self.recognizer.candidate_names(
+            idol_type=None if idol_type == "全部" else idol_type
+        )
         self.show_overlays = self.overlay_check.isChecked()
         self.show_details = self.details_check.isChecked()
+        self.auto_locate = self.locate_check.isChecked()
 
         self.snipping_tool = SnippingTool(self)
         self.snipping_tool.finished.connect(self.process_screenshot)
@@ -449,19 +700,33 @@ class CardStrengthGUI(QMainWindow):
                 screenshot = screenshot.convert('RGB')
             # 清除之前的缩略图和悬浮窗
             self.clear_results()
-            # 分割图像为网格
-            card_images = self.split_image_grid(screenshot)
+            # 自动定位卡牌,行列设置作为预期数量;检测数量远少于预期时退回网格分割
+            regions = []
+            locate_message = ""
+            if self.auto_locate:
+                regions = locate_card_regions(screenshot)
+                expected = self.grid_rows * self.grid_cols
+                if not regions:
+                    locate_message = "未检测到卡牌边框,已改用网格分割"
+                elif expected > 1 and len(regions) * 2 < expected:
+                    locate_message = f"仅检测到 {len(regions)}/{expected} 张卡牌,已改用网格分割"
+                    regions = []
+                elif len(regions) < expected:
+                    locate_message = f"仅检测到 {len(regions)}/{expected} 张卡牌"
+            if not regions:
+                regions = self.split_image_grid(screenshot)
             try:
                 # 处理每个子图像
                 results = []
-                for i, card_img in enumerate(card_images):
-                    card_info = self.recognizer.find_card_match(card_img)
-                    results.append((card_img, card_info))
+                for i, (row, col, box) in enumerate(regions):
+                    card_img = screenshot.crop(box)
+                    card_info = self.recognizer.find_card_match(card_img, self.candidates)
+                    results.append((card_img, card_info, (row, col, box)))
                     # 显示当前识别进度
-                    self.statusBar().showMessage(f"识别中: {i + 1}/{len(card_images)}")
+                    self.statusBar().showMessage(f"识别中: {i + 1}/{len(regions)}")
                     QApplication.processEvents()
                 # 显示结果
-                self.statusBar().showMessage('识别完成')
+                self.statusBar().showMessage(f"识别完成 {locate_message}".strip())
                 self.display_results(results, region)
             except Exception as e:
                 self.statusBar().showMessage(f"子图像处理错误: {str(e)}")
@@ -469,36 +734,27 @@ class CardStrengthGUI(QMainWindow):
             self.statusBar().showMessage(f"图像处理错误: {str(e)}")
 
     def split_image_grid(self, image):
+        """按行列等分,返回与locate_card_regions相同格式的 [(行, 列, 矩形)]"""
         width, height = image.size
         card_width = width // self.grid_cols
         card_height = height // self.grid_rows
 
-        card_images = []
+        regions = []
         for row in range(self.grid_rows):
             for col in range(self.grid_cols):
                 left = col * card_width
                 upper = row * card_height
                 right = left + card_width
                 lower = upper + card_height
-                card_img = image.crop((left, upper, right, lower))
-                card_images.append(card_img)
-        return card_images
+                regions.append((row, col, (left, upper, right, lower)))
+        return regions
 
     def display_results(self, results, region):
         try:
             # 清除之前的布局
             self.clear_results()
-            # 使用用户设置的实际行列数
-            rows = self.grid_rows
-            cols = self.grid_cols
-            num_cards = rows * cols  # 确保显示所有单元格
-            # 创建缩略图网格
-            for idx in range(num_cards):
-                row = idx // cols
-                col = idx % cols
-                # 获取对应的卡片结果（如果存在）
-                card_data = results[idx] if idx < len(results) else (None, None)
-                card_img, card_info = card_data
+            # 按每张卡的行列位置创建缩略图网格
+            for card_img, card_info, (row, col, box) in results:
                 # 优先使用本地图片
                 local_pixmap = None
 
@@ -537,14 +793,13 @@ class CardStrengthGUI(QMainWindow):
                 self.result_layout.addWidget(thumbnail, row, col, Qt.AlignCenter)
                 # 创建悬浮信息窗口（如果有卡片信息）
                 if card_info and self.show_overlays and isinstance(card_info, dict):
-                    # 计算每个卡片的精确位置
-                    card_width = region.width() // cols
-                    card_height = region.height() // rows
+                    # 卡片在截图中的精确位置
+                    left, upper, right, lower = box
                     overlay_rect = QRect(
-                        region.x() + col * card_width,
-                        region.y() + row * card_height,
-                        card_width,
-                        card_height
+                        region.x() + left,
+                        region.y() + upper,
+                        right - left,
+                        lower - upper
                     )
                     overlay = ResultOverlay(card_info, overlay_rect, self)
                     overlay.show()
@@ -580,7 +835,8 @@ class CardStrengthGUI(QMainWindow):
         info_text = f"<span style='color:{color}; font-size: 32px;'><b>{card_name}</b></span><br>"
         info_text += f"<span style='color:{color};font-size: 32px;'><b>主榜:</b> {card_info.get('main_ranks', '无')}</span><br>"
         info_text += f"<span style='color:{color};font-size: 32px;'><b>副榜:</b> {card_info.get('other_ranks', '无')}</span><br>"
-        info_text += f"<span style='color:{color};font-size: 32px;'><b>轨道颜色:</b> {card_info.get('railcolor', '无')}</span>"
+        info_text += f"<span style='color:{color};font-size: 32px;'><b>轨道颜色:</b> {card_info.get('railcolor', '无')}</span><br>"
+        info_text += f"<span style='color:{color};font-size: 32px;'><b>置信度:</b> {card_info.get('confidence', '无')}</span>"
 
         self.details_label.setText(info_text)
         self.card_info = card_info
@@ -607,6 +863,19 @@ class CardStrengthGUI(QMainWindow):
         # 关闭所有悬浮窗
         for overlay in self.overlays:
             overlay.close()
+        # 取消后台加载并等待线程结束,避免线程在销毁时仍在运行
+        if self.load_thread and self.load_thread.isRunning():
+            worker = self.load_worker
+            if worker is not None:
+                worker.finished.disconnect(self.database_loaded)
+                worker.cancel()
+            self.load_thread.quit()
+            self.load_thread.wait()
+            # 取消前已构建完成的识别器不会再交给主窗口,需要单独释放
+            if worker is not None and worker.recognizer is not None:
+                worker.recognizer.close()
+        if self.recognizer is not None:
+            self.recognizer.close()
         event.accept()
 
 
@@ -614,4 +883,5 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = CardStrengthGUI()
     window.show()
+    QTimer.singleShot(0, window.report_startup_time)
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,138 @@
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+"""
+多进程分片匹配: 全部卡牌描述子放在共享内存中,按卡牌边界切成N个分片,每个分片一个常驻进程。
+每次查询把截图描述子广播给所有分片,各分片返回每个描述子在本分片内的最近邻,
+主进程合并取全局最近邻,结果与单进程粗筛完全一致
+"""
+
+
+def _shard_worker(desc_name, owner_name, shape, start, end, task_queue, result_queue, shard_id):
+    import cv2
+    import numpy as np
+    from CardFeatures import nearest_descriptors
+    desc_shm = shared_memory.SharedMemory(name=desc_name)
+    owner_shm = shared_memory.SharedMemory(name=owner_name)
+    descriptors = np.ndarray(shape, dtype=np.uint8, buffer=desc_shm.buf)[start:end]
+    owners = np.ndarray((shape[0],), dtype=np.int32, buffer=owner_shm.buf)[start:end]
+    bf = cv2.BFMatcher(cv2.NORM_HAMMING)
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            sequence, des1 = task
+            try:
+                # 分片内同样按块匹配,单个分片超过2^18行也不会触发OpenCV限制
+                distances, owner_ids = nearest_descriptors(bf, des1, descriptors, owners)
+                result_queue.put((sequence, shard_id, distances, owner_ids, None))
+            except Exception as e:
+                distances = np.full(len(des1), np.inf, dtype=np.float32)
+                owner_ids = np.full(len(des1), -1, dtype=np.int32)
+                result_queue.put((sequence, shard_id, distances, owner_ids, str(e)))
+    finally:
+        del descriptors, owners
+        desc_shm.close()
+        owner_shm.close()
+
+
+class ShardedMatcher:
+    RESULT_TIMEOUT = 30  # 等待分片结果的秒数,分片进程异常退出时避免界面永久卡住
+    POLL_INTERVAL = 0.5  # 等待结果时检查分片进程存活的间隔秒数
+
+    def __init__(self, descriptors, owners, num_shards):
+        import numpy as np
+        self.shape = descriptors.shape
+        # 描述子和所属卡牌编号放入共享内存,子进程只映射不复制
+        self.desc_shm = shared_memory.SharedMemory(create=True, size=max(descriptors.nbytes, 1))
+        self.owner_shm = shared_memory.SharedMemory(create=True, size=max(owners.astype(np.int32).nbytes, 1))
+        np.ndarray(self.shape, dtype=np.uint8, buffer=self.desc_shm.buf)[:] = descriptors
+        np.ndarray((self.shape[0],), dtype=np.int32, buffer=self.owner_shm.buf)[:] = owners
+        self.result_queue = mp.Queue()
+        self.sequence = 0  # 查询序号,超时后迟到的旧结果按序号丢弃
+        self.task_queues = []
+        self.processes = []
+        for shard_id, (start, end) in enumerate(self.split_shards(owners, num_shards)):
+            task_queue = mp.Queue()
+            process = mp.Process(
+                target=_shard_worker,
+                args=(self.desc_shm.name, self.owner_shm.name, self.shape, start, end,
+                      task_queue, self.result_queue, shard_id),
+                daemon=True
+            )
+            process.start()
+            self.task_queues.append(task_queue)
+            self.processes.append(process)
+
+    @staticmethod
+    def split_shards(owners, num_shards):
+        """按描述子数量均分,切分点对齐到卡牌边界,同一张卡的描述子不会跨分片"""
+        import numpy as np
+        total = len(owners)
+        num_shards = max(1, min(num_shards, total))
+        cuts = [0]
+        for i in range(1, num_shards):
+            pos = total * i // num_shards
+            # 对齐到该卡牌描述子的起始位置
+            pos = int(np.searchsorted(owners, owners[pos], side='left'))
+            if pos > cuts[-1]:
+                cuts.append(pos)
+        cuts.append(total)
+        return list(zip(cuts[:-1], cuts[1:]))
+
+    def nearest(self, des1):
+        """广播查询并合并各分片结果,返回每个截图描述子的全局最近距离、所属卡牌编号和分片错误信息"""
+        import numpy as np
+        self.sequence += 1
+        for task_queue in self.task_queues:
+            task_queue.put((self.sequence, des1))
+        distances = np.full((len(self.task_queues), len(des1)), np.inf, dtype=np.float32)
+        owner_ids = np.full((len(self.task_queues), len(des1)), -1, dtype=np.int32)
+        errors = []
+        pending = set(range(len(self.task_queues)))
+        deadline = time.monotonic() + self.RESULT_TIMEOUT
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"分片{sorted(pending)}在{self.RESULT_TIMEOUT}秒内未返回结果")
+            try:
+                sequence, shard_id, shard_distances, shard_owners, error = self.result_queue.get(
+                    timeout=min(remaining, self.POLL_INTERVAL))
+            except queue.Empty:
+                # 分片进程已退出时立即失败,不必等到超时
+                dead = [shard for shard in sorted(pending) if not self.processes[shard].is_alive()]
+                if dead:
+                    raise RuntimeError(f"分片{dead}的进程已退出")
+                continue
+            if sequence != self.sequence or shard_id not in pending:
+                # 之前超时查询的迟到结果
+                continue
+            pending.discard(shard_id)
+            distances[shard_id] = shard_distances
+            owner_ids[shard_id] = shard_owners
+            if error:
+                errors.append(f"分片{shard_id}: {error}")
+        best = np.argmin(distances, axis=0)
+        columns = np.arange(len(des1))
+        return distances[best, columns], owner_ids[best, columns], errors
+
+    def close(self):
+        if self.desc_shm is None:
+            return
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.task_queues = []
+        self.processes = []
+        self.desc_shm.close()
+        self.desc_shm.unlink()
+        self.owner_shm.close()
+        self.owner_shm.unlink()
+        self.desc_shm = None
+        self.owner_shm = None
@@ -0,0 +1,248 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+from CardCatalog import parse_rank_text
+
+"""
+卡牌强度历史库: 把每次导出的CardRank(merge_card_ranks的结果)按快照追加写入SQLite,
+用于查询某张卡在通常排行/对决排行中的强度变化,以及某段时间内强度上升/下降的卡牌
+用法示例:
+python TierHistory.py import CardRank.xlsx --snapshot 2025-06-01
+python TierHistory.py import CardDataSnapshots.xlsx
+python TierHistory.py history 卡牌名.png --category 对决排行 --last 10
+python TierHistory.py changes 对决排行 --days 7 --up
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot TEXT PRIMARY KEY,
+    snapshot_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tier_history (
+    snapshot TEXT NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    card_name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    strength TEXT NOT NULL,
+    idol_type TEXT,
+    idol_rarity TEXT,
+    railcolor TEXT,
+    UNIQUE (snapshot, card_name, category)
+);
+CREATE INDEX IF NOT EXISTS idx_history_card ON tier_history (card_name, category, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_history_category ON tier_history (category, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_history_date ON tier_history (snapshot_date);
+"""
+
+
+def tier_rank(strength):
+    """把T0/T0.5/T1等强度转换为可比较的数值,越小越强;特殊/辅助sp等返回None"""
+    match = re.match(r'^T(\d+(?:\.\d+)?)', str(strength).strip())
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class TierHistoryStore:
+    def __init__(self, db_path="TierHistory.db"):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def check_snapshot(self, snapshot, snapshot_date):
+        """快照名已被其他日期的快照使用时抛出ValueError"""
+        existing = self.conn.execute(
+            "SELECT snapshot_date FROM snapshots WHERE snapshot = ?", (snapshot,)
+        ).fetchone()
+        if existing is not None and existing[0] != str(snapshot_date):
+            raise ValueError(f"快照名 {snapshot} 已存在(日期 {existing[0]}),与本次日期 {snapshot_date} 不同,请换一个快照名")
+
+    def add_snapshot(self, rank_df, snapshot, snapshot_date=None):
+        """追加一份merge_card_ranks结果,同一快照重复导入时忽略已有记录,返回新增条数
+        快照名已被其他日期的快照使用时抛出ValueError,避免静默丢弃数据"""
+        if snapshot_date is None:
+            snapshot_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        snapshot_date = str(snapshot_date)
+        self.check_snapshot(snapshot, snapshot_date)
+        rows = []
+        for _, row in rank_df.iterrows():
+            ranks = parse_rank_text(row.get('main_ranks')) + parse_rank_text(row.get('other_ranks'))
+            for category, strength in ranks:
+                rows.append((
+                    snapshot, snapshot_date, row['card_name'], category, strength,
+                    row.get('idol_type'), row.get('idol_rarity'), row.get('railcolor')
+                ))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO snapshots (snapshot, snapshot_date) VALUES (?, ?)",
+                (snapshot, snapshot_date)
+            )
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tier_history "
+                "(snapshot, snapshot_date, card_name, category, strength, idol_type, idol_rarity, railcolor) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            return self.conn.total_changes - before
+
+    def add_card_data(self, card_df):
+        """导入extract_batch生成的带快照标记的卡牌数据,按快照分别合并后写入"""
+        from MhtmlDataExtra import merge_card_ranks
+        groups = list(card_df.groupby(['snapshot', 'snapshot_date']))
+        # 先检查全部快照名,避免导入到一半才发现冲突
+        for (snapshot, snapshot_date), _ in groups:
+            self.check_snapshot(snapshot, snapshot_date)
+        dates = {}
+        for (snapshot, snapshot_date), _ in groups:
+            if dates.setdefault(snapshot, str(snapshot_date)) != str(snapshot_date):
+                raise ValueError(f"快照名 {snapshot} 对应多个日期,请换一个快照名")
+        added = 0
+        for (snapshot, snapshot_date), group in groups:
+            added += self.add_snapshot(merge_card_ranks(group), snapshot, snapshot_date)
+        return added
+
+    def snapshots(self, last_n=None):
+        """按时间顺序返回 [(快照, 日期)]"""
+        query = "SELECT snapshot, snapshot_date FROM snapshots ORDER BY snapshot_date DESC, snapshot DESC"
+        params = ()
+        if last_n:
+            query += " LIMIT ?"
+            params = (last_n,)
+        return list(reversed(self.conn.execute(query, params).fetchall()))
+
+    def card_history(self, card_name, category=None, last_n=None):
+        """某张卡最近last_n个快照的强度记录 [(日期, 快照, 类别, 强度)]"""
+        query = ("SELECT snapshot_date, snapshot, category, strength FROM tier_history "
+                 "WHERE card_name = ?")
+        params = [card_name]
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        if last_n:
+            recent = self.snapshots(last_n)
+            if not recent:
+                return []
+            query += " AND snapshot_date >= ?"
+            params.append(recent[0][1])
+        query += " ORDER BY snapshot_date, category"
+        return self.conn.execute(query, params).fetchall()
+
+    def snapshot_before(self, date):
+        """返回不晚于date的最近快照,没有则返回最早的快照"""
+        row = self.conn.execute(
+            "SELECT snapshot, snapshot_date FROM snapshots WHERE snapshot_date <= ? "
+            "ORDER BY snapshot_date DESC LIMIT 1", (str(date),)
+        ).fetchone()
+        if row is None:
+            row = self.conn.execute(
+                "SELECT snapshot, snapshot_date FROM snapshots ORDER BY snapshot_date LIMIT 1"
+            ).fetchone()
+        return row
+
+    def tier_changes(self, category, old_snapshot=None, new_snapshot=None):
+        """比较两个快照中某类排行的强度变化,默认比较最近两个快照
+        返回 [{'card_name', 'old', 'new', 'delta'}], delta>0表示强度上升, 非T级强度的delta为None"""
+        if old_snapshot is None or new_snapshot is None:
+            recent = self.snapshots(2)
+            if len(recent) < 2:
+                return []
+            old_snapshot = old_snapshot or recent[0][0]
+            new_snapshot = new_snapshot or recent[1][0]
+        rows = self.conn.execute(
+            "SELECT n.card_name, o.strength, n.strength FROM tier_history n "
+            "LEFT JOIN tier_history o ON o.card_name = n.card_name AND o.category = n.category "
+            "AND o.snapshot = ? "
+            "WHERE n.snapshot = ? AND n.category = ? AND (o.strength IS NULL OR o.strength != n.strength)",
+            (old_snapshot, new_snapshot, category)
+        ).fetchall()
+        changes = []
+        for card_name, old, new in rows:
+            old_rank, new_rank = tier_rank(old), tier_rank(new)
+            delta = None
+            if old_rank is not None and new_rank is not None:
+                delta = old_rank - new_rank
+            changes.append({'card_name': card_name, 'old': old, 'new': new, 'delta': delta})
+        changes.sort(key=lambda item: (item['delta'] is None, -(item['delta'] or 0), item['card_name']))
+        return changes
+
+    def tier_changes_since(self, category, days=7):
+        """最近days天内某类排行的强度变化: 用最新快照对比days天前的快照"""
+        recent = self.snapshots(1)
+        if not recent:
+            return []
+        latest_date = datetime.fromisoformat(recent[0][1])
+        old = self.snapshot_before((latest_date - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S'))
+        if old is None or old[0] == recent[0][0]:
+            return []
+        return self.tier_changes(category, old[0], recent[0][0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="卡牌强度历史查询")
+    parser.add_argument("--db", default="TierHistory.db", help="历史库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="导入CardRank.xlsx或批量导出的CardDataSnapshots.xlsx")
+    p_import.add_argument("excel_path")
+    p_import.add_argument("--snapshot", help="快照名,默认使用文件名")
+    p_import.add_argument("--date", help="快照日期,默认使用文件修改时间")
+
+    p_history = sub.add_parser("history", help="查询单张卡的强度变化")
+    p_history.add_argument("card_name")
+    p_history.add_argument("--category", help="通常排行/对决排行等")
+    p_history.add_argument("--last", type=int, help="只看最近N个快照")
+
+    p_changes = sub.add_parser("changes", help="查询某类排行的强度变化")
+    p_changes.add_argument("category")
+    p_changes.add_argument("--days", type=int, help="与N天前的快照比较,默认比较最近两个快照")
+    p_changes.add_argument("--up", action="store_true", help="只显示强度上升的卡牌")
+
+    args = parser.parse_args(argv)
+    with TierHistoryStore(args.db) as store:
+        if args.command == "import":
+            import pandas as pd
+            df = pd.read_excel(args.excel_path)
+            try:
+                if 'snapshot' in df.columns:
+                    added = store.add_card_data(df)
+                else:
+                    snapshot = args.snapshot or os.path.splitext(os.path.basename(args.excel_path))[0]
+                    date = args.date or datetime.fromtimestamp(
+                        os.path.getmtime(args.excel_path)).strftime('%Y-%m-%d %H:%M:%S')
+                    added = store.add_snapshot(df, snapshot, date)
+            except ValueError as e:
+                print(f"导入失败: {str(e)}")
+                return 1
+            print(f"新增 {added} 条强度记录")
+        elif args.command == "history":
+            for snapshot_date, snapshot, category, strength in store.card_history(
+                    args.card_name, args.category, args.last):
+                print(f"{snapshot_date}\t{snapshot}\t{category}\t{strength}")
+        elif args.command == "changes":
+            if args.days:
+                changes = store.tier_changes_since(args.category, args.days)
+            else:
+                changes = store.tier_changes(args.category)
+            for item in changes:
+                if args.up and not (item['delta'] and item['delta'] > 0):
+                    continue
+                print(f"{item['card_name']}\t{item['old'] or '新增'} -> {item['new']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())